@@ -1,16 +1,76 @@
 #!/usr/bin/env python3
 import argparse
-from confluent_kafka import Consumer, KafkaException
+import array
+import bisect
+import collections
+import concurrent.futures
+from confluent_kafka import Consumer, KafkaError, KafkaException, TopicPartition
 from confluent_kafka.admin import AdminClient
+import multiprocessing
 import hashlib
+import io
 import requests
 import json
+import queue
 import sqlite3
 import sys
-import os
+import threading
 import tty
 import termios
 import re
+from functools import lru_cache
+
+try:
+    import xxhash  # optional: much faster non-cryptographic hashing
+except ImportError:
+    xxhash = None
+
+try:
+    from pybloom_live import ScalableBloomFilter  # optional: low-memory approximate dedup
+except ImportError:
+    ScalableBloomFilter = None
+
+try:
+    import hyperscan  # optional: SIMD-accelerated DFA regex matching
+except ImportError:
+    hyperscan = None
+
+try:
+    from pyroaring import BitMap64  # optional: compressed bitmap for integer dedup keys
+except ImportError:
+    BitMap64 = None
+
+try:
+    import numpy as np  # optional: flat-array dedup structures
+except ImportError:
+    np = None
+
+try:
+    import orjson  # optional: much faster JSON parsing
+except ImportError:
+    orjson = None
+
+try:
+    import ijson  # optional: streaming JSON parsing for --stream-json
+except ImportError:
+    ijson = None
+
+try:
+    import msgspec  # optional: typed JSON decoding that skips unrelated keys
+except ImportError:
+    msgspec = None
+
+try:
+    from cuckoopy import CuckooFilter  # optional: compact fingerprint dedup for short keys
+except ImportError:
+    CuckooFilter = None
+
+# Parse with orjson when available; canonical *serialization* stays on stdlib
+# json so dedup keys don't depend on which optional packages are installed.
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+# Number of new SQLite rows to accumulate before committing the transaction.
+COMMIT_BATCH_SIZE = 1000
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Kafka topic inspector and deduplication tool.")
@@ -28,37 +88,269 @@ def parse_args():
     parser.add_argument('--start', choices=['earliest', 'latest'], default='earliest', help='Start offset')
     parser.add_argument('--dedup-by', choices=['value', 'key'], default='value', help='Field to deduplicate by (default: value)')
     parser.add_argument('--field', help='JSON field to deduplicate by (e.g., user.id). Overrides --dedup-by.')
+    parser.add_argument('--stream-json', action='store_true', help='Stream-parse large JSON payloads for --field extraction (requires ijson)')
     parser.add_argument('--max-messages', type=int, default=1000000, help='Limit messages to avoid OOM')
+    parser.add_argument('--parallel', type=int, help='Deduplicate with N per-partition worker processes')
+    parser.add_argument('--batch-size', type=int, default=500, help='Messages fetched per consume() call (default: 500)')
     parser.add_argument('--sqlite', help='Optional SQLite path for large-scale deduplication')
+    parser.add_argument('--safe-hash', action='store_true', help='Force SHA-256 keys for in-memory dedup (default uses xxhash/raw bytes)')
+    parser.add_argument('--bloom', action='store_true', help='Use a Bloom filter for in-memory dedup: 10-20x less memory, ~1e-6 false-positive rate (requires pybloom-live)')
+    parser.add_argument('--qht', action='store_true', help='Use a fixed-size quotient hash table for in-memory dedup: ~18 bytes/entry, exact up to --max-messages (requires numpy)')
+    parser.add_argument('--soa', action='store_true', help='Use a sorted numpy fingerprint array for in-memory dedup: 8 bytes/entry, whole batches checked in one vectorized pass (requires numpy)')
     parser.add_argument('--output', help='Optional path to output file (e.g., out.txt:text, out.jsonl:jsonl, out.csv:csv)')
     parser.add_argument('--silent', action='store_true', help='Suppress stdout output of duplicates')
+    parser.add_argument('--dedup-algorithm', choices=['sha256', 'xxh3-cuckoo'], default='sha256',
+                        help='Keying for in-memory dedup: sha256 (collision-resistant, default) or xxh3-cuckoo (xxh3 fingerprints in a cuckoo filter, suited to short keys; requires xxhash and cuckoopy)')
+    parser.add_argument('--fetch-min-bytes', type=int, default=1048576, help='Minimum bytes the broker accumulates before answering a fetch (default: 1048576)')
+    parser.add_argument('--fetch-wait-ms', type=int, default=500, help='Maximum time the broker waits to fill fetch.min.bytes (default: 500)')
+    parser.add_argument('--queued-min-messages', type=int, default=200000, help='Messages librdkafka prefetches per partition queue (default: 200000)')
+    parser.add_argument('--consumer-config', action='append', metavar='KEY=VALUE',
+                        help='Extra librdkafka consumer setting; repeatable, overrides the tuned defaults')
     return parser.parse_args()
 
+def build_consumer_conf(args, conf):
+    """Builds the consumer config: throughput-tuned defaults plus user overrides.
+
+    librdkafka's defaults fetch small and gate on queued.min.messages, leaving
+    several-x throughput on the table for bulk scans; these defaults favour
+    large, infrequent fetches. Any key can be overridden via --consumer-config.
+    """
+    consumer_conf = {
+        **conf,
+        'group.id': args.group_id,
+        'auto.offset.reset': args.start,
+        'fetch.min.bytes': args.fetch_min_bytes,
+        'fetch.wait.max.ms': args.fetch_wait_ms,
+        'queued.min.messages': args.queued_min_messages,
+        'queued.max.messages.kbytes': 262144,
+        'socket.receive.buffer.bytes': 1048576,
+        'enable.auto.commit': False,
+        'enable.partition.eof': True,
+    }
+    for override in args.consumer_config or []:
+        key, sep, value = override.partition('=')
+        if not sep:
+            print(f"Error: --consumer-config expects KEY=VALUE, got '{override}'.", file=sys.stderr)
+            sys.exit(1)
+        consumer_conf[key] = value
+    return consumer_conf
+
+def is_partition_eof(msg):
+    """True when the message is librdkafka's end-of-partition marker."""
+    return msg.error() is not None and msg.error().code() == KafkaError._PARTITION_EOF
+
+# Payloads above this size are hashed in chunks that stay hot in L2.
+_HASH_CHUNK_THRESHOLD = 1 << 20
+_HASH_CHUNK_SIZE = 256 * 1024
+
+def _load_simd_sha256():
+    """Binds StringZilla's SHA-NI sha256 via ctypes when the library is present.
+
+    Returns a payload -> 32-byte digest callable, or None so callers fall back
+    to hashlib. The digest is identical either way; only the backend differs.
+    """
+    try:
+        import ctypes
+        import ctypes.util
+        path = ctypes.util.find_library('stringzilla')
+        if not path:
+            return None
+        lib = ctypes.CDLL(path)
+        lib.sz_sha256_init.argtypes = [ctypes.c_void_p]
+        lib.sz_sha256_update.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_size_t]
+        lib.sz_sha256_digest.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+        def simd_sha256(payload: bytes) -> bytes:
+            # Comfortably larger than sz_sha256_state_t on any build.
+            state = ctypes.create_string_buffer(512)
+            out = ctypes.create_string_buffer(32)
+            lib.sz_sha256_init(state)
+            lib.sz_sha256_update(state, payload, len(payload))
+            lib.sz_sha256_digest(state, out)
+            return out.raw
+        # Sanity-check against hashlib once; bail out rather than trust a
+        # library that disagrees (e.g. no CPU SHA extensions path).
+        if simd_sha256(b'kafkainspect') != hashlib.sha256(b'kafkainspect').digest():
+            return None
+        return simd_sha256
+    except (OSError, AttributeError, ctypes.ArgumentError):
+        return None
+
+_simd_sha256 = _load_simd_sha256()
+
+def _sha256(payload: bytes):
+    # usedforsecurity=False skips FIPS bookkeeping and lets OpenSSL pick its
+    # fastest implementation; dedup keys are not a security boundary.
+    if len(payload) <= _HASH_CHUNK_THRESHOLD:
+        return hashlib.sha256(payload, usedforsecurity=False)
+    h = hashlib.sha256(usedforsecurity=False)
+    view = memoryview(payload) # no-copy slicing
+    for start in range(0, len(view), _HASH_CHUNK_SIZE):
+        h.update(view[start:start + _HASH_CHUNK_SIZE])
+    return h
+
+def _sha256_digest(payload: bytes) -> bytes:
+    if _simd_sha256 is not None:
+        return _simd_sha256(payload)
+    return _sha256(payload).digest()
+
+def digest_many(buffers):
+    """Hashes a batch of payloads, returning their full 32-byte digests.
+
+    Pure-Python fallback for the optional _kafkainspect_hash extension, which
+    runs the whole batch in one GIL-releasing C call. One call per consume
+    batch instead of one Python/C crossing per message.
+    """
+    digest = _sha256_digest
+    return [digest(buf) for buf in buffers]
+
+try:
+    from _kafkainspect_hash import digest_many  # optional: compiled batch hashing
+except ImportError:
+    pass
+
 def hash_payload(payload: bytes) -> str:
-    return hashlib.sha256(payload).hexdigest()
+    return _sha256_digest(payload).hex()
+
+def hash_payload_bytes(payload: bytes) -> bytes:
+    """Returns a truncated 16-byte raw digest; a 128-bit prefix is plenty for dedup."""
+    return _sha256_digest(payload)[:16]
+
+def _keys_sorted(data) -> bool:
+    """True when every object in the tree already lists its keys in order."""
+    if isinstance(data, dict):
+        prev = None
+        for key in data:
+            if prev is not None and key < prev:
+                return False
+            prev = key
+        return all(_keys_sorted(v) for v in data.values())
+    if isinstance(data, list):
+        return all(_keys_sorted(v) for v in data)
+    return True
+
+def canonical_bytes(data) -> bytes:
+    """Consistent byte representation of an extracted JSON value.
+
+    Scalars are rendered directly; invoking the JSON encoder just to turn 123
+    into b'123' is pure overhead on the dedup hot path. Containers still go
+    through sort_keys serialization for a canonical form, unless their keys
+    are already in order (common for producers that emit sorted JSON), in
+    which case the encoder skips its per-object sort.
+    """
+    if isinstance(data, str):
+        return data.encode('utf-8')
+    if isinstance(data, bool):
+        return b'true' if data else b'false'
+    if isinstance(data, (int, float)):
+        return repr(data).encode()
+    if _keys_sorted(data):
+        return json.dumps(data).encode('utf-8')
+    return json.dumps(data, sort_keys=True).encode('utf-8')
 
 def get_field_from_json(payload: bytes, field_path: str):
     """Extracts a nested value from a JSON payload using dot notation."""
+    return compile_field_extractor(field_path)(payload)
+
+def make_field_extractor(field_path: str):
+    """Builds a payload -> canonical bytes extractor with the path split once.
+
+    Splitting and argument setup happen here instead of per message, so the
+    hot loop only pays for the parse and the path walk.
+    """
+    keys = tuple(field_path.split('.'))
+    loads = _json_loads
+    to_bytes = canonical_bytes
+    # Container values pay a sort_keys serialization per message; duplicate
+    # payloads -- the very messages a dedup run keeps meeting -- skip it via
+    # a bounded canonical-form cache keyed on the raw bytes.
+    container_cache = {}
+    def extract(payload: bytes):
+        # Direct subscripting with exception handling beats an isinstance
+        # check plus .get() per level on the common all-hits path; missing
+        # keys and non-dict intermediates both surface as exceptions.
+        try:
+            data = loads(payload)
+            for key in keys:
+                data = data[key]
+        except (ValueError, KeyError, TypeError):
+            return None
+        if data is None:
+            return None
+        if isinstance(data, (dict, list)):
+            cached = container_cache.get(payload)
+            if cached is None:
+                cached = to_bytes(data)
+                if len(container_cache) >= 1024:
+                    container_cache.clear()
+                container_cache[payload] = cached
+            return cached
+        return to_bytes(data)
+    if msgspec is not None:
+        typed = _make_typed_extractor(keys, extract)
+        if typed is not None:
+            return typed
+    return extract
+
+def _make_typed_extractor(keys, fallback):
+    """Typed msgspec decoder for a dotted path; decodes only the path fields.
+
+    One nested Struct per path segment lets the decoder skip every unrelated
+    key without allocating dicts or strings for them; the leaf stays a Raw
+    slice that is parsed on its own. Anything the typed decode can't handle
+    -- invalid JSON, a missing segment, a non-object intermediate -- falls
+    back to the generic extractor. Returns None when the path can't be
+    expressed as struct fields.
+    """
+    inner = msgspec.Raw
     try:
-        data = json.loads(payload)
-        keys = field_path.split('.')
-        for key in keys:
-            if isinstance(data, dict):
-                data = data.get(key)
-            else:
-                return None # Path is longer than the object depth
+        for name in reversed(keys):
+            inner = msgspec.defstruct(f'_Path_{name}', [(name, inner)])
+        decoder = msgspec.json.Decoder(inner)
+    except (TypeError, ValueError):
+        return None
+    loads = _json_loads
+    to_bytes = canonical_bytes
+    def extract_typed(payload: bytes):
+        try:
+            obj = decoder.decode(payload)
+            for name in keys:
+                obj = getattr(obj, name)
+            data = loads(bytes(obj))
+        except (msgspec.DecodeError, AttributeError, ValueError):
+            return fallback(payload)
+        if data is None:
+            return None
+        return to_bytes(data)
+    return extract_typed
+
+# Memoize compilation so one-off callers like get_field_from_json pay the
+# split/closure setup once per distinct path, not once per call.
+compile_field_extractor = lru_cache(maxsize=128)(make_field_extractor)
+
+def get_field_from_json_stream(payload: bytes, field_path: str):
+    """Like get_field_from_json, but streams large payloads with ijson.
+
+    Stops parsing as soon as the requested path is produced instead of
+    materializing the whole tree. Requires the optional ijson package.
+    """
+    try:
+        for data in ijson.items(io.BytesIO(payload), field_path, use_float=True):
             if data is None:
-                return None # Key not found
-        # Re-serialize to get a consistent byte representation
-        return json.dumps(data, sort_keys=True).encode('utf-8')
-    except (json.JSONDecodeError, AttributeError):
+                return None
+            return canonical_bytes(data)
+        return None
+    except (ValueError, AttributeError, ijson.JSONError):
+        # ijson's parse errors subclass Exception, not ValueError; malformed
+        # payloads skip dedup the same way they do in the default extractor.
         return None
 
 def list_and_select_topic(consumer):
     """Lists topics, with interactive search if there are many."""
     try:
         metadata = consumer.list_topics(timeout=10)
-        topics = sorted(list(set(metadata.topics.keys())))
+        # metadata.topics is a dict, so its keys are already unique; sorting
+        # the keys view directly avoids building an intermediate set and list.
+        topics = sorted(metadata.topics.keys())
 
         if len(topics) <= 50:
             print("Available topics:")
@@ -68,23 +360,26 @@ def list_and_select_topic(consumer):
 
         # --- Interactive Mode ---
         search_term = ""
+        # Lowercase once up front so each keystroke compares case-insensitively
+        # without re-lowering every topic name.
+        index = [(t.lower(), t) for t in topics]
+        filtered = index
         original_settings = termios.tcgetattr(sys.stdin)
         try:
             tty.setraw(sys.stdin.fileno())
             while True:
-                # Redraw screen
-                os.system('cls' if os.name == 'nt' else 'clear')
+                # Redraw screen via ANSI clear+home; os.system('clear') forked
+                # a subprocess per keystroke.
+                sys.stdout.write('\x1b[2J\x1b[H')
                 print("--- Interactive Topic Search (Ctrl+C to exit) ---")
-                
-                filtered_topics = [t for t in topics if search_term in t]
-                
+
                 print(f"Search: {search_term}", end='\r\n')
                 print("-" * 30)
 
-                for topic in filtered_topics[:20]:
+                for _, topic in filtered[:20]:
                     print(topic)
-                if len(filtered_topics) > 20:
-                    print(f"...and {len(filtered_topics) - 20} more.")
+                if len(filtered) > 20:
+                    print(f"...and {len(filtered) - 20} more.")
 
                 # Get next character
                 char = sys.stdin.read(1)
@@ -92,8 +387,14 @@ def list_and_select_topic(consumer):
                     break
                 elif char == '\x7f': # Backspace
                     search_term = search_term[:-1]
+                    # Widening the term has to rescan the full index
+                    term = search_term.lower()
+                    filtered = [pair for pair in index if term in pair[0]]
                 elif char.isprintable():
                     search_term += char
+                    # Narrowing the term only rescans the current matches
+                    term = search_term.lower()
+                    filtered = [pair for pair in filtered if term in pair[0]]
         finally:
             termios.tcsetattr(sys.stdin, termios.TCSADRAIN, original_settings)
 
@@ -113,7 +414,14 @@ def get_cluster_overview(admin_client, schema_registry_url, connect_url):
         metadata = admin_client.list_topics(timeout=10)
         topics = metadata.topics
         topic_count = len(topics)
-        partition_count = sum(len(t.partitions) for t in topics.values())
+        # Single metadata pass: per-topic counts land in one compact int
+        # array (one attribute access per topic, reusable for any per-topic
+        # display later) and the total sums over it in C.
+        partition_counts = array.array('i')
+        append_count = partition_counts.append
+        for t in topics.values():
+            append_count(len(t.partitions))
+        partition_count = sum(partition_counts)
         broker_count = len(metadata.brokers)
 
         # Consumer groups
@@ -121,25 +429,41 @@ def get_cluster_overview(admin_client, schema_registry_url, connect_url):
         groups_result = groups_future.result()
         group_count = len(groups_result.valid)
 
-        # Schema Registry Subjects
-        subject_count = "N/A"
-        if schema_registry_url:
+        # Schema Registry / Kafka Connect: both GETs wait up to 5s each, so
+        # fire them concurrently and pay max(RTT) instead of the sum.
+        def count_json_array(response):
+            # Parse the raw bytes with the fast loader; Response.json() goes
+            # through stdlib json and is only kept as a fallback for
+            # responses without materialized content.
             try:
-                response = requests.get(f"{schema_registry_url}/subjects", timeout=5)
-                response.raise_for_status()
-                subject_count = len(response.json())
-            except (requests.RequestException, json.JSONDecodeError) as e:
-                subject_count = f"Error: {e}"
+                return len(_json_loads(response.content))
+            except (TypeError, ValueError):
+                return len(response.json())
 
-        # Kafka Connect Connectors
-        connector_count = "N/A"
-        if connect_url:
+        def count_remote(future):
             try:
-                response = requests.get(f"{connect_url}/connectors", timeout=5)
+                response = future.result()
                 response.raise_for_status()
-                connector_count = len(response.json())
-            except (requests.RequestException, json.JSONDecodeError) as e:
-                connector_count = f"Error: {e}"
+                return count_json_array(response)
+            except (requests.RequestException, ValueError) as e:
+                return f"Error: {e}"
+
+        subject_count = "N/A"
+        connector_count = "N/A"
+        # One Session shares pooled keep-alive connections across the calls.
+        session = requests.Session()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+            subjects_future = None
+            connectors_future = None
+            if schema_registry_url:
+                subjects_future = pool.submit(session.get, f"{schema_registry_url}/subjects", timeout=5)
+            if connect_url:
+                connectors_future = pool.submit(session.get, f"{connect_url}/connectors", timeout=5)
+            if subjects_future:
+                subject_count = count_remote(subjects_future)
+            if connectors_future:
+                connector_count = count_remote(connectors_future)
+        session.close()
 
         # Display results
         print("\n--- Kafka Cluster Overview ---")
@@ -192,29 +516,50 @@ def check_consumer_lag(consumer, topic, group_id):
     except KafkaException as e:
         print(f"Error checking lag: {e}", file=sys.stderr)
 
-def peek_messages(consumer, topic, num_messages):
+def peek_messages(consumer, topic, num_messages, batch_size=500):
     """Peeks at the first or last N messages of a topic."""
     print(f"Peeking at {'last' if num_messages > 0 else 'first'} {abs(num_messages)} messages in topic '{topic}'...")
-    consumer.subscribe([topic])
-    
-    messages = []
-    # For simplicity, we'll just consume and store. A more advanced implementation
-    # would seek to the correct offsets before consuming for "last N".
+    n = abs(num_messages)
+
+    if num_messages > 0:
+        # Last N: seek each partition near its high watermark so we touch
+        # O(N) messages instead of consuming the whole topic.
+        metadata = consumer.list_topics(topic, timeout=10)
+        topic_meta = metadata.topics.get(topic)
+        if topic_meta is None:
+            print(f"Error: Topic '{topic}' not found.", file=sys.stderr)
+            consumer.close()
+            return
+        partitions = sorted(topic_meta.partitions.keys())
+        per_partition = -(-n // len(partitions)) # ceil division
+        assignments = []
+        for p in partitions:
+            low, high = consumer.get_watermark_offsets(TopicPartition(topic, p), timeout=5)
+            assignments.append(TopicPartition(topic, p, max(low, high - per_partition)))
+        consumer.assign(assignments)
+    else:
+        consumer.subscribe([topic])
+
+    # The deque bounds memory to N even if we consume a little past the target.
+    messages = collections.deque(maxlen=n)
     try:
-        while True:
-            msg = consumer.poll(1.0)
-            if msg is None: break
-            if msg.error(): raise KafkaException(msg.error())
-            messages.append(msg)
-            if len(messages) >= abs(num_messages) and num_messages < 0:
-                break # Stop after N for "first N"
+        done = False
+        while not done:
+            msgs = consumer.consume(num_messages=batch_size, timeout=1.0)
+            if not msgs: break
+            for msg in msgs:
+                if msg.error():
+                    if is_partition_eof(msg):
+                        continue # reached the current end of this partition
+                    raise KafkaException(msg.error())
+                messages.append(msg)
+                if len(messages) >= n and num_messages < 0:
+                    done = True # Stop after N for "first N"
+                    break
     finally:
         consumer.close()
 
-    if num_messages > 0: # Last N
-        messages_to_show = messages[-num_messages:]
-    else: # First N
-        messages_to_show = messages
+    messages_to_show = list(messages)
 
     for msg in messages_to_show:
         print(f"--- Offset: {msg.offset()}, Partition: {msg.partition()} ---")
@@ -225,46 +570,351 @@ def peek_messages(consumer, topic, num_messages):
     print(f"\nDisplayed {len(messages_to_show)} messages.")
 
 
-def search_messages(consumer, topic, pattern, use_regex, max_messages):
+def make_regex_matcher(pattern: str):
+    """Compiles a regex matcher over raw bytes.
+
+    Returns a callable taking the raw message value and returning True on
+    match. The search method is bound once so the per-message call skips the
+    attribute lookup as well as the re module's pattern-cache probe.
+    """
+    search = re.compile(pattern.encode()).search
+    return lambda raw: search(raw) is not None
+
+def make_batch_matcher(pattern: str, use_regex: bool):
+    """Compiles a values -> per-value match flags function for a whole batch.
+
+    With Hyperscan, literal searches concatenate the batch NUL-separated and
+    scan it in a single SIMD pass, mapping match offsets back to messages by
+    bisecting the value-start table; the escaped literal can never contain a
+    NUL, so a match can't straddle a boundary. Regexes follow PCRE byte
+    semantics where `.`, negated classes and the like DO match NUL, so they
+    scan each value separately against one compiled database. Without
+    Hyperscan -- or for patterns it can't compile, since it supports only a
+    subset of PCRE (no backreferences or lookaround) -- the precompiled
+    per-message matcher runs over the batch in a plain loop.
+    """
+    if hyperscan is not None:
+        expr = pattern.encode() if use_regex else re.escape(pattern).encode()
+        flag = hyperscan.HS_FLAG_SINGLEMATCH if use_regex else hyperscan.HS_FLAG_SOM_LEFTMOST
+        db = hyperscan.Database()
+        try:
+            db.compile(expressions=[expr], ids=[0], flags=[flag])
+        except hyperscan.error:
+            db = None # pattern uses constructs Hyperscan can't compile
+        if db is not None and use_regex:
+            def match_batch(values):
+                flags = []
+                for value in values:
+                    matched = []
+                    db.scan(value, match_event_handler=lambda mid, f, t, fl, ctx: matched.append(True))
+                    flags.append(bool(matched))
+                return flags
+            return match_batch
+        if db is not None:
+            def match_batch(values):
+                starts = []
+                pos = 0
+                for value in values:
+                    starts.append(pos)
+                    pos += len(value) + 1 # +1 for the NUL separator
+                flags = [False] * len(values)
+                def on_match(mid, from_, to, match_flags, ctx):
+                    flags[bisect.bisect_right(starts, from_) - 1] = True
+                db.scan(b'\x00'.join(values), match_event_handler=on_match)
+                return flags
+            return match_batch
+
+    if use_regex:
+        matcher = make_regex_matcher(pattern)
+    else:
+        pattern_bytes = pattern.encode()
+        matcher = lambda raw: pattern_bytes in raw
+    return lambda values: [matcher(value) for value in values]
+
+def search_messages(consumer, topic, pattern, use_regex, max_messages, batch_size=500):
     """Searches for messages containing a pattern."""
     consumer.subscribe([topic])
-    
+
     print(f"Searching for pattern '{pattern}' in topic '{topic}'...")
     found_count = 0
     scanned_count = 0
+    match_batch = make_batch_matcher(pattern, use_regex)
 
     try:
         while scanned_count < max_messages:
-            msg = consumer.poll(1.0)
-            if msg is None:
+            msgs = consumer.consume(num_messages=min(batch_size, max_messages - scanned_count), timeout=1.0)
+            if not msgs:
                 break # End of topic
-            if msg.error(): raise KafkaException(msg.error())
-
-            scanned_count += 1
-            value_str = msg.value().decode(errors='ignore')
-            
-            match = False
-            if use_regex:
-                if re.search(pattern, value_str):
-                    match = True
-            else:
-                if pattern in value_str:
-                    match = True
-            
-            if match:
-                found_count += 1
-                print(f"--- Match Found (Offset: {msg.offset()}) ---")
-                print(value_str)
-                print("-" * (20 + len(str(msg.offset()))))
+
+            batch_msgs = []
+            for msg in msgs:
+                if msg.error():
+                    if is_partition_eof(msg):
+                        continue # reached the current end of this partition
+                    raise KafkaException(msg.error())
+                batch_msgs.append(msg)
+            scanned_count += len(batch_msgs)
+
+            flags = match_batch([msg.value() for msg in batch_msgs])
+            for msg, matched in zip(batch_msgs, flags):
+                if matched:
+                    found_count += 1
+                    # Decode only matched messages, and only for display.
+                    print(f"--- Match Found (Offset: {msg.offset()}) ---")
+                    print(msg.value().decode(errors='ignore'))
+                    print("-" * (20 + len(str(msg.offset()))))
 
     finally:
         consumer.close()
         print(f"\nScanned {scanned_count} messages and found {found_count} matches.")
 
 
+class QHT:
+    """Fixed-size quotient-style hash table for low-memory dedup.
+
+    Stores truncated fingerprints in a flat numpy uint64 array probed over a
+    short linear window: one cache line per lookup instead of the pointer
+    chase of a set of bytes objects, at ~9 bytes per slot. At loads at or
+    below 0.5 (capacity = 2x expected entries) it is exact in practice; past
+    that a full probe window evicts its least-recently-seen fingerprint, so
+    treat results as approximate. Requires numpy.
+    """
+
+    PROBE_WINDOW = 8
+
+    def __init__(self, capacity, fp_bits=32):
+        self.capacity = max(int(capacity), self.PROBE_WINDOW)
+        self._fp_mask = (1 << fp_bits) - 1
+        self._fps = np.zeros(self.capacity, dtype=np.uint64)
+        self._age = np.zeros(self.capacity, dtype=np.uint8)
+
+    def insert_if_new(self, h: bytes) -> bool:
+        """Inserts the hash, returning True when it was not already present."""
+        x = int.from_bytes(h[:8], 'little')
+        idx = x % self.capacity
+        # Nonzero fingerprint drawn from bits independent of the slot index.
+        fp = ((x >> 20) & self._fp_mask) | 1
+        fps = self._fps
+        age = self._age
+        evict_slot = idx
+        evict_age = 256
+        for off in range(self.PROBE_WINDOW):
+            slot = (idx + off) % self.capacity
+            v = int(fps[slot])
+            if v == fp:
+                age[slot] = 0
+                return False
+            if v == 0:
+                fps[slot] = fp
+                age[slot] = 0
+                return True
+            a = int(age[slot])
+            if a < 255:
+                age[slot] = a + 1
+            if a < evict_age:
+                evict_age = a
+                evict_slot = slot
+        # Window full: replace the youngest resident fingerprint.
+        fps[evict_slot] = fp
+        age[evict_slot] = 0
+        return True
+
+class DedupIndex:
+    """Structure-of-arrays dedup index over 64-bit fingerprints.
+
+    Instead of a set of boxed bytes objects, membership lives in one sorted
+    contiguous numpy uint64 array that a whole consume-batch is checked
+    against in a single vectorized np.isin pass. New fingerprints accumulate
+    in a small pending set and are merge-sorted into the array every
+    FLUSH_EVERY insertions, amortizing the sort. Requires numpy.
+    """
+
+    FLUSH_EVERY = 4096
+
+    def __init__(self):
+        self._sorted = np.empty(0, dtype=np.uint64)
+        self._pending = set()
+
+    def check_and_insert_batch(self, fps):
+        """Returns per-fingerprint duplicate flags, inserting the new ones."""
+        in_sorted = np.isin(fps, self._sorted)
+        pending = self._pending
+        flags = []
+        append = flags.append
+        for fp, hit in zip(fps.tolist(), in_sorted.tolist()):
+            if hit or fp in pending:
+                append(True)
+            else:
+                pending.add(fp)
+                append(False)
+        if len(pending) >= self.FLUSH_EVERY:
+            self._flush()
+        return flags
+
+    def _flush(self):
+        merged = np.concatenate([
+            self._sorted,
+            np.fromiter(self._pending, dtype=np.uint64, count=len(self._pending)),
+        ])
+        merged.sort()
+        self._sorted = merged
+        self._pending = set()
+
+
+def process_batch(payloads, seen, key_of=None):
+    """Dedup-checks a batch of payloads against `seen`, returning per-payload flags.
+
+    Pure-Python fallback for the optional compiled _dedup_core extension.
+    Everything the inner loop touches is bound to a local up front, so the
+    interpreted version carries as little dispatch overhead as the language
+    allows.
+    """
+    flags = []
+    append = flags.append
+    contains = seen.__contains__
+    add = seen.add
+    for payload in payloads:
+        key = key_of(payload) if key_of is not None else payload
+        if contains(key):
+            append(True)
+        else:
+            add(key)
+            append(False)
+    return flags
+
+try:
+    from _dedup_core import process_batch  # optional: Cython-compiled hot loop
+except ImportError:
+    pass
+
+def _dedup_partition_worker(conf, topic, partitions, batch_size, max_messages, dedup_by, field, queue):
+    """Consumes the assigned partitions and ships dedup hashes to the parent.
+
+    Runs in a worker process; partitions are the unit of parallelism, so each
+    worker owns a disjoint partition set and only the hash/offset tuples cross
+    the process boundary.
+    """
+    consumer = Consumer(conf)
+    extract_field = make_field_extractor(field) if field else None
+    count = 0
+    try:
+        consumer.assign([TopicPartition(topic, p) for p in partitions])
+        while count < max_messages:
+            msgs = consumer.consume(num_messages=min(batch_size, max_messages - count), timeout=1.0)
+            if not msgs:
+                break
+            payloads = []
+            positions = []
+            for msg in msgs:
+                if msg.error():
+                    if is_partition_eof(msg):
+                        continue # reached the current end of this partition
+                    raise KafkaException(msg.error())
+                if extract_field is not None:
+                    payload = extract_field(msg.value())
+                elif dedup_by == 'value':
+                    payload = msg.value()
+                else: # key
+                    payload = msg.key()
+                if payload is None:
+                    continue
+                payloads.append(payload)
+                positions.append((msg.partition(), msg.offset()))
+                count += 1
+            if payloads:
+                digests = digest_many(payloads)
+                queue.put([(digests[i][:16],) + positions[i] for i in range(len(payloads))])
+    finally:
+        consumer.close()
+        queue.put(None) # per-worker end-of-stream sentinel
+
+def parallel_dedup(args, conf):
+    """Deduplicates a topic with N worker processes, one partition set each.
+
+    Workers hash their partitions independently; this process is the single
+    writer draining their hashes into the dedup store.
+    """
+    admin_client = AdminClient(conf)
+    metadata = admin_client.list_topics(args.topic, timeout=10)
+    topic_meta = metadata.topics.get(args.topic)
+    if topic_meta is None:
+        print(f"Error: Topic '{args.topic}' not found.", file=sys.stderr)
+        sys.exit(1)
+    partitions = sorted(topic_meta.partitions.keys())
+
+    num_workers = min(args.parallel, len(partitions))
+    consumer_conf = build_consumer_conf(args, conf)
+    per_worker_max = -(-args.max_messages // num_workers) # ceil division
+
+    queue = multiprocessing.Queue()
+    workers = []
+    for i in range(num_workers):
+        assigned = partitions[i::num_workers]
+        w = multiprocessing.Process(
+            target=_dedup_partition_worker,
+            args=(consumer_conf, args.topic, assigned, args.batch_size,
+                  per_worker_max, args.dedup_by, args.field, queue))
+        w.start()
+        workers.append(w)
+
+    db = None
+    cursor = None
+    seen = set()
+    if args.sqlite:
+        db = sqlite3.connect(args.sqlite)
+        cursor = db.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("CREATE TABLE IF NOT EXISTS seen (hash BLOB PRIMARY KEY) WITHOUT ROWID")
+        db.commit()
+
+    count = 0
+    duplicates = 0
+    finished = 0
+    try:
+        while finished < num_workers:
+            batch = queue.get()
+            if batch is None:
+                finished += 1
+                continue
+            for h, partition, offset in batch:
+                is_duplicate = False
+                if cursor is not None:
+                    cursor.execute(
+                        "INSERT INTO seen (hash) VALUES (?) ON CONFLICT(hash) DO NOTHING RETURNING 1",
+                        (sqlite3.Binary(h),))
+                    if cursor.fetchone() is None:
+                        is_duplicate = True
+                elif h in seen:
+                    is_duplicate = True
+                else:
+                    seen.add(h)
+                if is_duplicate:
+                    duplicates += 1
+                    if not args.silent:
+                        print(f"[Duplicate] Offset: {offset} Partition: {partition}")
+                count += 1
+    finally:
+        for w in workers:
+            w.join()
+        if db:
+            db.commit()
+            db.close()
+
+    print(f"Scanned {count} messages, found {duplicates} duplicates.")
+
 def main():
     args = parse_args()
-    
+
+    # When stdout is a pipe there is no reader expecting line-by-line
+    # updates, so switch to block buffering and skip per-line flushes.
+    if not sys.stdout.isatty():
+        try:
+            sys.stdout.reconfigure(line_buffering=False, write_through=False)
+        except (AttributeError, io.UnsupportedOperation):
+            pass
+
     conf = {'bootstrap.servers': args.bootstrap_servers}
     
     if args.overview:
@@ -273,8 +923,7 @@ def main():
         return
 
     # For other operations, initialize the consumer
-    consumer_conf = {**conf, 'group.id': args.group_id, 'auto.offset.reset': args.start}
-    consumer = Consumer(consumer_conf)
+    consumer = Consumer(build_consumer_conf(args, conf))
 
     if args.list_topics:
         list_and_select_topic(consumer)
@@ -291,121 +940,282 @@ def main():
         if not args.topic:
             print("Error: --topic is required when using --search.", file=sys.stderr)
             sys.exit(1)
-        search_messages(consumer, args.topic, args.search, args.regex, args.max_messages)
+        search_messages(consumer, args.topic, args.search, args.regex, args.max_messages, args.batch_size)
         return
 
     if args.peek:
         if not args.topic:
             print("Error: --topic is required when using --peek.", file=sys.stderr)
             sys.exit(1)
-        peek_messages(consumer, args.topic, args.peek)
+        peek_messages(consumer, args.topic, args.peek, args.batch_size)
         return
 
     if not args.topic:
         print("Error: --topic is required for deduplication.", file=sys.stderr)
         sys.exit(1)
 
+    if args.parallel:
+        # Workers only ship (hash, partition, offset) tuples to the parent,
+        # so the output sinks have no key/value bytes to write.
+        if args.output:
+            print("Error: --output is not supported with --parallel.", file=sys.stderr)
+            sys.exit(1)
+        if args.bloom or args.qht or args.soa or args.dedup_algorithm != 'sha256':
+            print("Warning: --bloom/--qht/--soa/--dedup-algorithm are ignored with --parallel; "
+                  "the parent process dedups with the exact set (or SQLite).", file=sys.stderr)
+        consumer.close()
+        parallel_dedup(args, conf)
+        return
+
+    extract_field = None
+    if args.field:
+        if args.stream_json:
+            if ijson is None:
+                print("Error: --stream-json requires the ijson package.", file=sys.stderr)
+                sys.exit(1)
+            field_path = args.field
+            extract_field = lambda payload: get_field_from_json_stream(payload, field_path)
+        else:
+            extract_field = compile_field_extractor(args.field)
+
     consumer.subscribe([args.topic])
 
     seen = set()
+    if BitMap64 is not None and xxhash is not None and not args.safe_hash:
+        # The in-memory keys are xxh3 64-bit ints, which a Roaring bitmap
+        # stores in a fraction of a set's memory with no resize rehashing.
+        seen = BitMap64()
+    bloom = None
+    if args.bloom:
+        if ScalableBloomFilter is None:
+            print("Error: --bloom requires the pybloom-live package.", file=sys.stderr)
+            sys.exit(1)
+        bloom = ScalableBloomFilter(initial_capacity=args.max_messages, error_rate=1e-6)
+    qht = None
+    if args.qht:
+        if np is None:
+            print("Error: --qht requires the numpy package.", file=sys.stderr)
+            sys.exit(1)
+        # Capacity 2x the expected entries keeps the load factor at 0.5,
+        # where the table stays exact.
+        qht = QHT(capacity=2 * args.max_messages)
+    soa_index = None
+    if args.soa:
+        if np is None:
+            print("Error: --soa requires the numpy package.", file=sys.stderr)
+            sys.exit(1)
+        soa_index = DedupIndex()
+    cuckoo = None
+    if args.dedup_algorithm == 'xxh3-cuckoo':
+        if xxhash is None or CuckooFilter is None:
+            # An algorithm hint, not a storage guarantee: degrade to the
+            # default exact path rather than refusing to run.
+            print("Warning: --dedup-algorithm xxh3-cuckoo needs the xxhash and cuckoopy packages; using the default dedup path.", file=sys.stderr)
+        else:
+            cuckoo = CuckooFilter(capacity=args.max_messages, fingerprint_size=2)
     db = None
     cursor = None
     if args.sqlite:
         db = sqlite3.connect(args.sqlite)
         cursor = db.cursor()
-        cursor.execute("CREATE TABLE IF NOT EXISTS seen (hash TEXT PRIMARY KEY)")
+        # WAL + relaxed sync collapses the per-insert fsync cost; commits are
+        # batched below so N inserts share a single transaction.
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("CREATE TABLE IF NOT EXISTS seen (hash BLOB PRIMARY KEY) WITHOUT ROWID")
+        db.commit()
 
     output_file = None
     output_format = 'text'
     csv_writer = None
+    csv_text = None
     if args.output:
         parts = args.output.split(':')
         path = parts[0]
         if len(parts) > 1:
             output_format = parts[1].lower()
-        
-        output_file = open(path, 'w', newline='')
+
+        # Binary file with a large buffer: one syscall per MiB instead of per row.
+        output_file = open(path, 'wb', buffering=1 << 20)
         if output_format == 'csv':
             import csv
-            csv_writer = csv.writer(output_file)
+            csv_text = io.TextIOWrapper(output_file, newline='', write_through=False)
+            csv_writer = csv.writer(csv_text)
             csv_writer.writerow(['timestamp', 'partition', 'offset', 'key', 'value'])
 
     
+    # The set hashes its keys internally, so SHA-256 here is pure overhead
+    # unless explicitly requested via --safe-hash.
+    key_of = None
+    if not args.sqlite:
+        if args.safe_hash:
+            key_of = hash_payload_bytes
+        elif xxhash is not None:
+            key_of = xxhash.xxh3_64_intdigest
+
     count = 0
     duplicates = 0
+    pending_commits = 0
+
+    # Duplicate reporting runs on its own thread so the consume loop never
+    # blocks on terminal writes; lines flow through a SimpleQueue and a None
+    # sentinel shuts the writer down once the loop is finished.
+    report_queue = None
+    report_thread = None
+    if not args.silent:
+        report_queue = queue.SimpleQueue()
+        def drain_reports():
+            write = sys.stdout.write
+            while True:
+                line = report_queue.get()
+                if line is None:
+                    break
+                write(line)
+        report_thread = threading.Thread(target=drain_reports, daemon=True)
+        report_thread.start()
 
     try:
         while count < args.max_messages:
-            msg = consumer.poll(1.0)
-            if msg is None:
+            msgs = consumer.consume(num_messages=min(args.batch_size, args.max_messages - count), timeout=1.0)
+            if not msgs:
                 break # End of topic
-            if msg.error(): raise KafkaException(msg.error())
 
-            payload = None
-            if args.field:
-                payload = get_field_from_json(msg.value(), args.field)
-            elif args.dedup_by == 'value':
-                payload = msg.value()
-            else: # key
-                payload = msg.key()
+            # Phase 1: extract payloads for the whole consume batch.
+            batch_msgs = []
+            batch_payloads = []
+            for msg in msgs:
+                if count + len(batch_msgs) >= args.max_messages:
+                    break
+                if msg.error():
+                    if is_partition_eof(msg):
+                        continue # reached the current end of this partition
+                    raise KafkaException(msg.error())
+
+                payload = None
+                if args.field:
+                    payload = extract_field(msg.value())
+                elif args.dedup_by == 'value':
+                    payload = msg.value()
+                else: # key
+                    payload = msg.key()
 
-            if payload is None:
-                continue
-            
-            h = hash_payload(payload)
-            is_duplicate = False
-            
+                if payload is None:
+                    continue
+                batch_msgs.append(msg)
+                batch_payloads.append(payload)
+
+            # Phase 2: dedup the batch. The common in-memory path runs in one
+            # process_batch call instead of an interpreted branch per message,
+            # and the SQLite path hashes the whole batch in one call.
+            dup_flags = None
+            batch_digests = None
             if args.sqlite:
-                cursor.execute("SELECT 1 FROM seen WHERE hash = ?", (h,))
-                if cursor.fetchone():
-                    is_duplicate = True
-                else:
-                    cursor.execute("INSERT INTO seen (hash) VALUES (?)", (h,))
-                    db.commit()
-            else:
-                if h in seen:
-                    is_duplicate = True
+                batch_digests = digest_many(batch_payloads)
+            elif qht is not None:
+                batch_digests = digest_many(batch_payloads)
+                dup_flags = [not qht.insert_if_new(d) for d in batch_digests]
+            elif soa_index is not None:
+                batch_digests = digest_many(batch_payloads)
+                fps = np.frombuffer(b''.join(d[:8] for d in batch_digests), dtype=np.uint64)
+                dup_flags = soa_index.check_and_insert_batch(fps)
+            elif cuckoo is not None:
+                # xxh3 fingerprints into the cuckoo filter: no SHA-256, ~2
+                # bytes per resident entry instead of a stored digest.
+                xxh3 = xxhash.xxh3_64_digest
+                flags = []
+                for p in batch_payloads:
+                    fp = xxh3(p)
+                    if cuckoo.contains(fp):
+                        flags.append(True)
+                    else:
+                        cuckoo.insert(fp)
+                        flags.append(False)
+                dup_flags = flags
+            elif bloom is None:
+                dup_flags = process_batch(batch_payloads, seen, key_of)
+
+            for i, msg in enumerate(batch_msgs):
+                is_duplicate = False
+                if dup_flags is not None:
+                    is_duplicate = dup_flags[i]
+                elif args.sqlite:
+                    h = batch_digests[i][:16]
+                    # Single-statement upsert: RETURNING yields a row only when
+                    # the hash was new, so insert and dup check share one round-trip.
+                    cursor.execute(
+                        "INSERT INTO seen (hash) VALUES (?) ON CONFLICT(hash) DO NOTHING RETURNING 1",
+                        (sqlite3.Binary(h),))
+                    if cursor.fetchone() is None:
+                        is_duplicate = True
+                    else:
+                        pending_commits += 1
+                        if pending_commits >= COMMIT_BATCH_SIZE:
+                            db.commit()
+                            pending_commits = 0
                 else:
-                    seen.add(h)
+                    key = key_of(batch_payloads[i]) if key_of is not None else batch_payloads[i]
+                    # Approximate membership: a positive is a duplicate up to
+                    # the filter's false-positive rate, for ~1 bit per entry.
+                    if key in bloom:
+                        is_duplicate = True
+                    else:
+                        bloom.add(key)
 
-            if is_duplicate:
-                duplicates += 1
-                if not args.silent:
-                    print(
-                        f"[Duplicate] Offset: {msg.offset()} Partition: {msg.partition()} Timestamp: {msg.timestamp()[1]}\n"
-                        f"Value: {msg.value().decode(errors='ignore')[:100]}...\n"
-                    )
-                
-                if output_file:
-                    ts_type, ts_val = msg.timestamp()
-                    if output_format == 'jsonl':
-                        record = {
-                            'timestamp': ts_val,
-                            'partition': msg.partition(),
-                            'offset': msg.offset(),
-                            'key': msg.key().decode(errors='ignore') if msg.key() else None,
-                            'value': msg.value().decode(errors='ignore')
-                        }
-                        output_file.write(json.dumps(record) + '\n')
-                    elif output_format == 'csv' and csv_writer:
-                        csv_writer.writerow([
-                            ts_val,
-                            msg.partition(),
-                            msg.offset(),
-                            msg.key().decode(errors='ignore') if msg.key() else '',
-                            msg.value().decode(errors='ignore')
-                        ])
-                    else: # Plain text
-                        output_file.write(
-                            f"Timestamp: {ts_val}, Partition: {msg.partition()}, Offset: {msg.offset()}\n"
-                            f"Value: {msg.value().decode(errors='ignore')}\n---\n"
+                if is_duplicate:
+                    duplicates += 1
+                    # Decode key/value once and share across all sinks; skip
+                    # entirely when nothing consumes them.
+                    if not args.silent or output_file:
+                        value_str = msg.value().decode(errors='ignore')
+                        key_str = msg.key().decode(errors='ignore') if msg.key() else None
+                    if not args.silent:
+                        report_queue.put(
+                            f"[Duplicate] Offset: {msg.offset()} Partition: {msg.partition()} Timestamp: {msg.timestamp()[1]}\n"
+                            f"Value: {value_str[:100]}...\n\n"
                         )
 
-            count += 1
+                    if output_file:
+                        ts_type, ts_val = msg.timestamp()
+                        if output_format == 'jsonl':
+                            record = {
+                                'timestamp': ts_val,
+                                'partition': msg.partition(),
+                                'offset': msg.offset(),
+                                'key': key_str,
+                                'value': value_str
+                            }
+                            if orjson is not None:
+                                output_file.write(orjson.dumps(record) + b'\n')
+                            else:
+                                output_file.write(json.dumps(record).encode() + b'\n')
+                        elif output_format == 'csv' and csv_writer:
+                            csv_writer.writerow([
+                                ts_val,
+                                msg.partition(),
+                                msg.offset(),
+                                key_str if key_str is not None else '',
+                                value_str
+                            ])
+                        else: # Plain text
+                            output_file.write(
+                                f"Timestamp: {ts_val}, Partition: {msg.partition()}, Offset: {msg.offset()}\n"
+                                f"Value: {value_str}\n---\n".encode()
+                            )
+
+                count += 1
     finally:
         consumer.close()
-        if db: db.close()
-        if output_file: output_file.close()
+        if report_thread is not None:
+            report_queue.put(None)
+            report_thread.join() # every queued line is on screen before the summary
+        if db:
+            db.commit()
+            db.close()
+        if csv_text:
+            csv_text.close() # flushes and closes the underlying binary file
+        elif output_file:
+            output_file.close()
 
     print(f"Scanned {count} messages, found {duplicates} duplicates.")
 